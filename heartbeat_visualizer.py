@@ -1,9 +1,71 @@
 import pygame
+import numpy as np
 import math
 import time
-from collections import deque
 from typing import Optional
 
+try:
+    from numba import njit
+except ImportError:  # Numba is optional; fall back to plain Python
+    njit = None
+
+
+# Define color stops: [position, (r, g, b)]
+# Extrapolated colors for 20-180 BPM range
+_COLOR_STOPS = (
+    (0.0,   (64, 0, 64)),     # Dark Purple (20 BPM)
+    (0.125, (96, 0, 96)),     # Medium Purple (40 BPM)
+    (0.1875, (128, 0, 128)),  # Purple (50 BPM)
+    (0.28,  (0, 0, 255)),     # Blue (65 BPM)
+    (0.375, (0, 255, 0)),     # Green (80 BPM)
+    (0.53,  (255, 255, 0)),   # Yellow (105 BPM)
+    (0.69,  (255, 165, 0)),   # Orange (130 BPM)
+    (0.84,  (255, 0, 0)),     # Red (155 BPM)
+    (1.0,   (255, 192, 203)),  # Pink (180 BPM)
+)
+
+# HR values covered by the y-position LUT (8-bit HR range; higher values clamp off-screen)
+_Y_LUT_SIZE = 256
+
+
+def _update_range_py(hr, lo, hi, lo_base, hi_base, pad, smooth):
+    """Compute the new (hr_min, hr_max, glow_intensity) for an incoming HR"""
+    # Normalize HR to 0-1 range against the current range
+    hr_normalized = (hr - lo) / (hi - lo)
+    hr_normalized = max(0.0, min(1.0, hr_normalized))  # Clamp to 0-1
+    
+    # More intense glow for higher HR
+    glow = hr_normalized * 0.8 + 0.2
+    
+    # Calculate target range (current HR ± padding)
+    target_min = max(lo_base, hr - pad)
+    target_max = min(hi_base, hr + pad)
+    
+    # Smooth transition to new range to avoid jarring jumps
+    lo += (target_min - lo) * smooth
+    hi += (target_max - hi) * smooth
+    
+    # Ensure minimum range span of 40 BPM for visual clarity
+    if hi - lo < 40.0:
+        center = (lo + hi) / 2
+        lo = center - 20.0
+        hi = center + 20.0
+        
+        # Clamp to base limits
+        lo = max(lo_base, lo)
+        hi = min(hi_base, hi)
+    
+    return lo, hi, glow
+
+
+if njit is not None:
+    _update_range = njit(cache=True, fastmath=True)(_update_range_py)
+    # Compile (or load from cache) at import so the first HR packet isn't delayed
+    _update_range(70.0, 20.0, 180.0, 20.0, 180.0, 20.0, 0.1)
+else:
+    _update_range = _update_range_py
+
+
 class HeartbeatVisualizer:
     def __init__(self, width=1200, height=400, hr_min=20, hr_max=180):
         pygame.init()
@@ -33,45 +95,99 @@ class HeartbeatVisualizer:
         self.glow_color = (0, 255, 100)
         
         # Data storage - much faster movement, store fewer points relative to width
-        self.hr_history = deque(maxlen=width // 2)  # Store fewer points for faster movement
-        self.time_history = deque(maxlen=width // 2)
+        # HR samples live in a fixed uint16 ring buffer covering the full 16-bit HRM field (oldest samples overwritten)
+        self._hr_buf = np.zeros(max(1, width // 2), dtype=np.uint16)  # Store fewer points for faster movement
+        self._hr_head = 0  # Next write position
+        self._hr_len = 0  # Number of valid samples
         self.current_hr = 0
         self.last_beat_time = 0
         
         # ECG data storage
-        self.ecg_history = deque(maxlen=width * 4)  # Store more ECG points for smooth waveform
+        # ECG samples live in a float32 ring buffer, like the HR history
+        self._ecg_buf = np.zeros(width * 4, dtype=np.float32)  # Store more ECG points for smooth waveform
+        self._ecg_head = 0  # Next write position
+        self._ecg_len = 0  # Number of valid samples
         self.ecg_enabled = False
+        self.ecg_height = 80  # ECG strip at the bottom of the window
+        
+        # Running ECG min/max for normalization (rescanned only after samples drop off)
+        self._ecg_min = math.inf
+        self._ecg_max = -math.inf
+        self._ecg_minmax_dirty = False
         
         # Animation
         self.glow_intensity = 0
         self.pulse_phase = 0
         self.clock = pygame.time.Clock()
+        self._frame_time: float = 0.0  # Timestamp shared by everything drawn in a frame
+        
+        # Skip redraws when nothing on screen has changed
+        self._dirty = True
+        self._pulse_was_active = False
         
         # Fonts
         self.font_large = pygame.font.Font(None, 48)
         self.font_medium = pygame.font.Font(None, 32)
         self.font_small = pygame.font.Font(None, 24)
         
-    def update_heart_rate(self, hr: int, rr_intervals: list = None):
+        # Cached background grid and rendered grid labels
+        self._grid_cache: Optional[pygame.Surface] = None
+        self._grid_cache_key = None
+        self._label_cache: dict[tuple[int, int], pygame.Surface] = {}
+        self._grid_font_cache: dict[int, pygame.font.Font] = {}
+        self._grid_metrics_cache: dict[tuple[int, int], tuple] = {}
+        
+        # Precomputed HR -> color gradient, rebuilt when its integer bounds change
+        self._color_lut: list[tuple] = []
+        self._color_lut_range = (int(hr_min), int(hr_max))
+        self._rebuild_color_lut()
+        
+        # Precomputed HR -> screen y, rebuilt when the range or window height changes
+        self._y_lut = np.zeros(_Y_LUT_SIZE, dtype=np.float32)
+        self._rebuild_y_lut()
+        
+        # Reusable drawing surfaces (recreated whenever the window is resized)
+        self._create_surfaces()
+        
+    def _create_surfaces(self):
+        """Allocate the scratch surfaces that are redrawn every frame"""
+        # Must run after set_mode() so surfaces match the display pixel format
+        self._glow_surf = pygame.Surface((self.width, self.height), pygame.SRCALPHA).convert_alpha()
+        
+        # Downscale/upscale pair used to blur the heartbeat line into a glow
+        small_size = (max(1, self.width // 4), max(1, self.height // 4))
+        self._glow_small = pygame.Surface(small_size, pygame.SRCALPHA).convert_alpha()
+        self._glow_blur = pygame.Surface((self.width, self.height), pygame.SRCALPHA).convert_alpha()
+        
+        # Single-pixel grid line strips, re-alpha'd per line
+        self._hline_surf = pygame.Surface((self.width, 1)).convert()
+        self._hline_surf.fill(self.grid_color)
+        self._vline_surf = pygame.Surface((1, self.height)).convert()
+        self._vline_surf.fill(self.grid_color)
+        
+        # ECG strip background and glow layer
+        self._ecg_bg_surf = pygame.Surface((self.width, self.ecg_height)).convert()
+        self._ecg_bg_surf.set_alpha(40)
+        self._ecg_bg_surf.fill((0, 20, 0))  # Dark green background
+        self._ecg_line_surf = pygame.Surface((self.width, self.ecg_height)).convert()
+        self._ecg_line_surf.set_colorkey((0, 0, 0))
+        self._ecg_label = self.font_small.render("ECG", True, (0, 200, 100)).convert_alpha()
+        
+    def update_heart_rate(self, hr: int, rr_intervals: tuple = None):
         """Update the heart rate data"""
+        # Called from the data path outside render(), so read the clock directly
         current_time = time.time()
         
         self.current_hr = hr
-        self.hr_history.append(hr)
-        self.time_history.append(current_time)
+        self._dirty = True
+        self._hr_buf[self._hr_head] = hr
+        self._hr_head = (self._hr_head + 1) % self._hr_buf.size
+        self._hr_len = min(self._hr_len + 1, self._hr_buf.size)
         
-        # Update glow intensity based on HR
-        if hr > 0:
-            # Normalize HR to 0-1 range
-            hr_normalized = (hr - self.hr_min) / (self.hr_max - self.hr_min)
-            hr_normalized = max(0, min(1, hr_normalized))  # Clamp to 0-1
-            
-            # More intense glow for higher HR
-            self.glow_intensity = hr_normalized * 0.8 + 0.2
-            
-        # Update dynamic range based on current HR
+        # Update glow intensity and dynamic range based on current HR
         if hr > 0:
-            self.update_dynamic_range(hr)
+            self.hr_min, self.hr_max, self.glow_intensity = self._compute_range(hr)
+            self._sync_luts()
             
         # Trigger pulse animation
         if rr_intervals and len(rr_intervals) > 0:
@@ -79,99 +195,210 @@ class HeartbeatVisualizer:
     
     def update_dynamic_range(self, current_hr: int):
         """Update dynamic HR range based on current heart rate"""
-        # Calculate target range (current HR ± padding)
-        target_min = max(self.hr_min_base, current_hr - self.dynamic_range_padding)
-        target_max = min(self.hr_max_base, current_hr + self.dynamic_range_padding)
-        
-        # Smooth transition to new range to avoid jarring jumps
-        self.hr_min += (target_min - self.hr_min) * self.range_smoothing
-        self.hr_max += (target_max - self.hr_max) * self.range_smoothing
-        
-        # Ensure minimum range span of 40 BPM for visual clarity
-        if self.hr_max - self.hr_min < 40:
-            center = (self.hr_min + self.hr_max) / 2
-            self.hr_min = center - 20
-            self.hr_max = center + 20
-            
-            # Clamp to base limits
-            self.hr_min = max(self.hr_min_base, self.hr_min)
-            self.hr_max = min(self.hr_max_base, self.hr_max)
+        self.hr_min, self.hr_max, _ = self._compute_range(current_hr)
+        self._sync_luts()
     
-    def update_ecg_data(self, ecg_samples: list):
-        """Update ECG data"""
-        if ecg_samples:
-            self.ecg_enabled = True
-            self.ecg_history.extend(ecg_samples)
+    def _compute_range(self, hr: int) -> tuple:
+        """Run the (optionally JIT-compiled) range/glow kernel for an HR sample"""
+        return _update_range(
+            float(hr), float(self.hr_min), float(self.hr_max),
+            float(self.hr_min_base), float(self.hr_max_base),
+            float(self.dynamic_range_padding), float(self.range_smoothing),
+        )
     
-    def get_hr_color(self, hr: int) -> tuple:
-        """Get color based on heart rate with smooth gradient: purple → blue → green → yellow → orange → red → pink"""
-        if hr == 0:
-            return (100, 100, 100)  # Gray for no signal
+    def _sync_luts(self):
+        """Refresh lookup tables after the dynamic range moved"""
+        self._rebuild_y_lut()
         
-        # Clamp HR to our range
-        hr = max(self.hr_min, min(self.hr_max, hr))
-        
-        # Normalize HR to 0-1 range
-        normalized = (hr - self.hr_min) / (self.hr_max - self.hr_min)
-        
-        # Define color stops: [position, (r, g, b)]
-        # Extrapolated colors for 20-180 BPM range
-        color_stops = [
-            (0.0,   (64, 0, 64)),     # Dark Purple (20 BPM)
-            (0.125, (96, 0, 96)),     # Medium Purple (40 BPM)
-            (0.1875, (128, 0, 128)),  # Purple (50 BPM)
-            (0.28,  (0, 0, 255)),     # Blue (65 BPM) 
-            (0.375, (0, 255, 0)),     # Green (80 BPM)
-            (0.53,  (255, 255, 0)),   # Yellow (105 BPM)
-            (0.69,  (255, 165, 0)),   # Orange (130 BPM)
-            (0.84,  (255, 0, 0)),     # Red (155 BPM)
-            (1.0,   (255, 192, 203))  # Pink (180 BPM)
-        ]
-        
-        # Find the two color stops to interpolate between
-        for i in range(len(color_stops) - 1):
-            pos1, color1 = color_stops[i]
-            pos2, color2 = color_stops[i + 1]
+        # Recompute colors only when the integer range actually moved
+        if self._color_lut_bounds() != self._color_lut_range:
+            self._rebuild_color_lut()
+    
+    def _rebuild_y_lut(self):
+        """Precompute the screen y position of every representable HR value"""
+        margin = max(20, self.height // 10)  # Same adaptive margin as grid
+        available_height = self.height - 2 * margin
+        hrs = np.arange(_Y_LUT_SIZE, dtype=np.float32)
+        self._y_lut[:] = self.height - margin - (hrs - self.hr_min) / (self.hr_max - self.hr_min) * available_height
+    
+    def _hr_view(self) -> np.ndarray:
+        """Return the stored HR samples oldest-first (copies only when wrapped)"""
+        if self._hr_len < self._hr_buf.size or self._hr_head == 0:
+            return self._hr_buf[:self._hr_len]
+        return np.concatenate((self._hr_buf[self._hr_head:], self._hr_buf[:self._hr_head]))
+    
+    def _resize_hr_buffer(self, size: int):
+        """Reallocate the HR ring buffer, keeping the most recent samples"""
+        recent = self._hr_view()[-size:]
+        self._hr_buf = np.zeros(size, dtype=np.uint16)
+        self._hr_buf[:recent.size] = recent
+        self._hr_len = recent.size
+        self._hr_head = recent.size % size
+    
+    def update_ecg_data(self, ecg_samples):
+        """Update ECG data from a list or NumPy array of samples"""
+        samples = np.asarray(ecg_samples, dtype=np.float32)
+        if samples.size == 0:
+            return
+        
+        self.ecg_enabled = True
+        self._dirty = True
+        
+        size = self._ecg_buf.size
+        n = samples.size
+        
+        # Old samples falling off the front may have held the min/max
+        if self._ecg_len + n > size:
+            self._ecg_minmax_dirty = True
+        else:
+            self._ecg_min = min(self._ecg_min, float(samples.min()))
+            self._ecg_max = max(self._ecg_max, float(samples.max()))
+        
+        # Copy into the ring, splitting the write when it wraps past the end
+        if n >= size:
+            self._ecg_buf[:] = samples[-size:]
+            self._ecg_head = 0
+        else:
+            end = self._ecg_head + n
+            if end <= size:
+                self._ecg_buf[self._ecg_head:end] = samples
+            else:
+                first = size - self._ecg_head
+                self._ecg_buf[self._ecg_head:] = samples[:first]
+                self._ecg_buf[:n - first] = samples[first:]
+            self._ecg_head = end % size
+        self._ecg_len = min(self._ecg_len + n, size)
+    
+    def _ecg_view(self) -> np.ndarray:
+        """Return the stored ECG samples oldest-first (copies only when wrapped)"""
+        if self._ecg_len < self._ecg_buf.size or self._ecg_head == 0:
+            return self._ecg_buf[:self._ecg_len]
+        return np.concatenate((self._ecg_buf[self._ecg_head:], self._ecg_buf[:self._ecg_head]))
+    
+    def _resize_ecg_buffer(self, size: int):
+        """Reallocate the ECG ring buffer, keeping the most recent samples"""
+        recent = self._ecg_view()[-size:]
+        self._ecg_buf = np.zeros(size, dtype=np.float32)
+        self._ecg_buf[:recent.size] = recent
+        self._ecg_len = recent.size
+        self._ecg_head = recent.size % size
+        self._ecg_minmax_dirty = True
+    
+    def _color_lut_bounds(self) -> tuple:
+        """Integer HR span the color LUT covers for the current range"""
+        lut_min = int(self.hr_min)
+        # Round up so the last entry clamps to hr_max; an inverted range still gets one entry
+        return lut_min, max(lut_min, math.ceil(self.hr_max))
+    
+    def _rebuild_color_lut(self):
+        """Precompute the HR color gradient for every integer HR in the current range"""
+        lut_min, lut_max = self._color_lut_bounds()
+        
+        lut = []
+        for hr in range(lut_min, lut_max + 1):
+            # Clamp HR to our range
+            clamped = max(self.hr_min, min(self.hr_max, hr))
             
-            if pos1 <= normalized <= pos2:
-                # Interpolate between color1 and color2
-                t = (normalized - pos1) / (pos2 - pos1) if pos2 != pos1 else 0
-                
-                r = int(color1[0] + (color2[0] - color1[0]) * t)
-                g = int(color1[1] + (color2[1] - color1[1]) * t)
-                b = int(color1[2] + (color2[2] - color1[2]) * t)
+            # Normalize HR to 0-1 range
+            normalized = (clamped - self.hr_min) / (self.hr_max - self.hr_min)
+            
+            # Fallback (shouldn't be used)
+            color = (255, 255, 255)
+            
+            # Find the two color stops to interpolate between
+            for i in range(len(_COLOR_STOPS) - 1):
+                pos1, color1 = _COLOR_STOPS[i]
+                pos2, color2 = _COLOR_STOPS[i + 1]
                 
-                return (r, g, b)
+                if pos1 <= normalized <= pos2:
+                    # Interpolate between color1 and color2
+                    t = (normalized - pos1) / (pos2 - pos1) if pos2 != pos1 else 0
+                    
+                    r = int(color1[0] + (color2[0] - color1[0]) * t)
+                    g = int(color1[1] + (color2[1] - color1[1]) * t)
+                    b = int(color1[2] + (color2[2] - color1[2]) * t)
+                    
+                    color = (r, g, b)
+                    break
+            
+            lut.append(color)
+        
+        self._color_lut = lut
+        self._color_lut_range = (lut_min, lut_max)
+        
+        # Label colors come from the LUT, so re-render them on next use
+        self._label_cache.clear()
+    
+    def get_hr_color(self, hr: int) -> tuple:
+        """Get color based on heart rate with smooth gradient: purple → blue → green → yellow → orange → red → pink"""
+        if hr <= 0:
+            return (100, 100, 100)  # Gray for no signal
         
-        # Fallback (shouldn't reach here)
-        return (255, 255, 255)
+        # Out-of-range HRs clamp to the ends of the gradient
+        index = hr - self._color_lut_range[0]
+        return self._color_lut[max(0, min(len(self._color_lut) - 1, index))]
     
     def draw_grid(self):
         """Draw background grid like a hospital monitor"""
+        # The grid only changes with the window size, the (rounded) HR range,
+        # or when the ECG strip appears
+        key = (self.width, self.height, round(self.hr_min), round(self.hr_max), self.ecg_enabled)
+        if key != self._grid_cache_key:
+            self._grid_cache = pygame.Surface((self.width, self.height)).convert()
+            self._render_grid(self._grid_cache)
+            self._grid_cache_key = key
+        
+        self.screen.blit(self._grid_cache, (0, 0))
+    
+    def _grid_metrics(self) -> tuple:
+        """Return (margin, available_height, label_interval, grid_interval, font_size) for the window size"""
+        key = (self.width, self.height)
+        metrics = self._grid_metrics_cache.get(key)
+        if metrics is not None:
+            return metrics
+        
         # Adaptive margins and spacing based on window height
         margin = max(20, self.height // 10)  # Responsive margin
         
         # Calculate optimal label spacing based on window height
         available_height = self.height - 2 * margin
-        hr_range = self.hr_max - self.hr_min
         
         # Determine label interval based on available space (readable spacing)
         if available_height < 150:  # Very small window
             label_interval = 20  # Every 20 BPM
             grid_interval = 10   # Grid every 10 BPM
-            font_to_use = pygame.font.Font(None, 32)  # Readable font
+            font_size = 32  # Readable font
         elif available_height < 250:  # Small window
             label_interval = 10  # Every 10 BPM
             grid_interval = 10   # Grid every 10 BPM
-            font_to_use = pygame.font.Font(None, 36)  # Bigger font
+            font_size = 36  # Bigger font
         elif available_height < 400:  # Medium window
             label_interval = 10  # Every 10 BPM
             grid_interval = 5    # Grid every 5 BPM
-            font_to_use = pygame.font.Font(None, 40)  # Large font
+            font_size = 40  # Large font
         else:  # Large window
             label_interval = 10  # Every 10 BPM
             grid_interval = 5    # Grid every 5 BPM
-            font_to_use = pygame.font.Font(None, 48)  # Extra large font
+            font_size = 48  # Extra large font
+        
+        metrics = (margin, available_height, label_interval, grid_interval, font_size)
+        self._grid_metrics_cache[key] = metrics
+        return metrics
+    
+    def _grid_font(self, size: int) -> pygame.font.Font:
+        """Return the grid label font of the given size, loading it once"""
+        font = self._grid_font_cache.get(size)
+        if font is None:
+            font = pygame.font.Font(None, size)
+            self._grid_font_cache[size] = font
+        return font
+    
+    def _render_grid(self, surface: pygame.Surface):
+        """Render the background and grid lines onto the given surface"""
+        surface.fill(self.bg_color)
+        
+        margin, available_height, label_interval, grid_interval, font_size = self._grid_metrics()
+        hr_range = self.hr_max - self.hr_min
         
         # Calculate minimum pixels between labels (generous spacing)
         min_label_spacing = 24  # Doubled from 12 to 24
@@ -185,104 +412,102 @@ class HeartbeatVisualizer:
         grid_end = int(self.hr_max // grid_interval + 1) * grid_interval
         
         for hr in range(grid_start, grid_end + 1, grid_interval):
-            # Calculate y position using full range
-            y = self.height - margin - ((hr - self.hr_min) / (self.hr_max - self.hr_min)) * available_height
+            # Look up y position using full range
+            y = float(self._y_lut[min(hr, _Y_LUT_SIZE - 1)])
             
             if margin <= y <= self.height - margin:
                 alpha = 120 if hr % (label_interval * 2) == 0 else 60
-                # Create a surface for alpha blending
-                line_surf = pygame.Surface((self.width, 1))
-                line_surf.set_alpha(alpha)
-                line_surf.fill(self.grid_color)
-                self.screen.blit(line_surf, (0, int(y)))
+                self._hline_surf.set_alpha(alpha)
+                surface.blit(self._hline_surf, (0, int(y)))
                 
                 # Label grid lines with adaptive spacing
                 if hr % label_interval == 0:
-                    label_color = self.get_hr_color(hr)
-                    label = font_to_use.render(f"{hr}", True, label_color)
+                    label = self._label_cache.get((hr, font_size))
+                    if label is None:
+                        label_color = self.get_hr_color(hr)
+                        label = self._grid_font(font_size).render(f"{hr}", True, label_color).convert_alpha()
+                        self._label_cache[(hr, font_size)] = label
                     # Adjust label position to not overlap
                     label_y = max(margin // 2, min(int(y) - label.get_height() // 2, self.height - margin // 2 - label.get_height()))
-                    self.screen.blit(label, (10, label_y))
+                    surface.blit(label, (10, label_y))
+        
+        # Vertical time lines (adaptive to width), clipped to the plot area
+        draw_top = margin // 2
+        draw_bottom = self.height - (self.ecg_height if self.ecg_enabled else margin // 2)
+        vline_area = pygame.Rect(0, 0, 1, max(0, draw_bottom - draw_top))
         
-        # Vertical time lines (adaptive to width)
         vertical_spacing = max(20, self.width // 40)  # Responsive vertical line spacing
         for i in range(0, self.width, vertical_spacing):
             alpha = 80 if i % (vertical_spacing * 2) == 0 else 40
-            line_surf = pygame.Surface((1, self.height))
-            line_surf.set_alpha(alpha)
-            line_surf.fill(self.grid_color)
-            self.screen.blit(line_surf, (i, 0))
+            self._vline_surf.set_alpha(alpha)
+            surface.blit(self._vline_surf, (i, draw_top), vline_area)
     
     def draw_heartbeat_line(self):
         """Draw the heartbeat waveform with rainbow coloring"""
-        if len(self.hr_history) < 2:
+        if self._hr_len < 2:
             return
             
-        current_time = time.time()
+        current_time = self._frame_time
         margin = max(20, self.height // 10)  # Use same adaptive margin as grid
-        available_height = self.height - 2 * margin
         
-        # Create segments with individual colors
-        segments = []
-        for i, (hr, timestamp) in enumerate(zip(self.hr_history, self.time_history)):
-            # Much faster movement: map fewer data points across full screen width
-            x = self.width - (len(self.hr_history) - i) * 2
-            
-            # Use full range positioning with adaptive margins
-            base_y = self.height - margin - ((hr - self.hr_min) / (self.hr_max - self.hr_min)) * available_height
+        # Heartbeat pulse offset is the same for every point, so compute it once per frame
+        pulse_amplitude = 0.0
+        time_since_beat = current_time - self.last_beat_time
+        if time_since_beat < 0.3:  # Pulse lasts 300ms
+            pulse_phase = (time_since_beat / 0.3) * math.pi
+            pulse_amplitude = math.sin(pulse_phase) * 15 * self.glow_intensity
+        
+        # Convert the history once and position every point in bulk
+        hr_view = self._hr_view()
+        n = hr_view.size
+        
+        # Much faster movement: map fewer data points across full screen width
+        x = self.width - np.arange(n, 0, -1, dtype=np.int32) * 2
+        
+        # Use full range positioning with adaptive margins
+        y = self._y_lut[np.minimum(hr_view, _Y_LUT_SIZE - 1)] + pulse_amplitude
+        
+        # Keep only the points that land inside the drawable area
+        visible = (x >= 0) & (x < self.width) & (y >= margin) & (y <= self.height - margin)
+        xs = x[visible]
+        ys = y[visible].astype(np.int32)
+        hrs = hr_view[visible].astype(np.int32)
+        
+        # Draw segments with individual colors onto the shared glow layer
+        if xs.size > 1:
+            self._glow_surf.fill((0, 0, 0, 0))
+            points = list(zip(xs.tolist(), ys.tolist()))
             
-            # Add heartbeat pulse effect
-            pulse_amplitude = 0
-            time_since_beat = current_time - self.last_beat_time
-            if time_since_beat < 0.3:  # Pulse lasts 300ms
-                pulse_phase = (time_since_beat / 0.3) * math.pi
-                pulse_amplitude = math.sin(pulse_phase) * 15 * self.glow_intensity
+            # Use the average HR for the segment color
+            avg_hr = (hrs[:-1] + hrs[1:]) // 2
             
-            y = base_y + pulse_amplitude
+            # Consecutive segments sharing a color are drawn as one polyline
+            breaks = (np.flatnonzero(avg_hr[1:] != avg_hr[:-1]) + 1).tolist()
+            starts = [0] + breaks
+            ends = breaks + [avg_hr.size]
+            avg_hr = avg_hr.tolist()
+            for start, end in zip(starts, ends):
+                color = self.get_hr_color(avg_hr[start])
+                pygame.draw.lines(self._glow_surf, color, False, points[start:end + 1], 2)
             
-            if 0 <= x < self.width and margin <= y <= self.height - margin:
-                segments.append((x, y, hr))
-        
-        # Draw segments with individual colors and enhanced thickness
-        if len(segments) > 1:
-            for thickness in range(8, 0, -1):  # Thicker lines for better effect
-                alpha = int(200 / thickness)
-                
-                # Create surface for this thickness layer
-                line_surf = pygame.Surface((self.width, self.height))
-                line_surf.set_alpha(alpha)
-                line_surf.fill((0, 0, 0))
-                line_surf.set_colorkey((0, 0, 0))
-                
-                # Draw each segment with its own color
-                for i in range(len(segments) - 1):
-                    x1, y1, hr1 = segments[i]
-                    x2, y2, hr2 = segments[i + 1]
-                    
-                    # Use the average HR for the segment color
-                    avg_hr = (hr1 + hr2) / 2
-                    color = self.get_hr_color(int(avg_hr))
-                    
-                    if abs(x2 - x1) > 0 or abs(y2 - y1) > 0:
-                        pygame.draw.line(line_surf, color, (int(x1), int(y1)), (int(x2), int(y2)), thickness)
-                
-                self.screen.blit(line_surf, (0, 0))
+            # Blur by scaling down 4x and back up, add it as a halo, then draw the sharp line on top
+            pygame.transform.smoothscale(self._glow_surf, self._glow_small.get_size(), self._glow_small)
+            pygame.transform.smoothscale(self._glow_small, self._glow_blur.get_size(), self._glow_blur)
+            self.screen.blit(self._glow_blur, (0, 0), special_flags=pygame.BLEND_RGB_ADD)
+            self.screen.blit(self._glow_surf, (0, 0))
     
     def draw_ecg_waveform(self):
         """Draw ECG waveform at the bottom of the screen"""
-        if not self.ecg_enabled or len(self.ecg_history) < 2:
+        if not self.ecg_enabled or self._ecg_len < 2:
             return
         
-        # ECG display area (bottom 80 pixels)
-        ecg_height = 80
+        # ECG display area (bottom strip)
+        ecg_height = self.ecg_height
         ecg_y_start = self.height - ecg_height
         ecg_y_center = ecg_y_start + ecg_height // 2
         
         # Draw ECG background
-        ecg_bg = pygame.Surface((self.width, ecg_height))
-        ecg_bg.set_alpha(40)
-        ecg_bg.fill((0, 20, 0))  # Dark green background
-        self.screen.blit(ecg_bg, (0, ecg_y_start))
+        self.screen.blit(self._ecg_bg_surf, (0, ecg_y_start))
         
         # Draw ECG grid lines
         for i in range(0, self.width, 60):
@@ -291,54 +516,53 @@ class HeartbeatVisualizer:
         # Draw center line
         pygame.draw.line(self.screen, (0, 50, 0), (0, ecg_y_center), (self.width, ecg_y_center), 1)
         
-        # Convert ECG samples to screen coordinates
-        points = []
-        ecg_samples = list(self.ecg_history)
+        # Convert ECG samples to screen coordinates in one vectorized pass
+        ecg_samples = self._ecg_view()
         
         # Normalize ECG values
-        if ecg_samples:
-            min_val = min(ecg_samples)
-            max_val = max(ecg_samples)
-            val_range = max_val - min_val if max_val != min_val else 1
-            
-            # Take recent samples to fit screen width
-            samples_to_show = min(len(ecg_samples), self.width * 2)
-            recent_samples = ecg_samples[-samples_to_show:]
-            
-            for i, sample in enumerate(recent_samples):
-                # X position (right to left scrolling)
-                x = self.width - (len(recent_samples) - i) // 2
-                
-                # Y position (normalized and inverted for display)
-                normalized = (sample - min_val) / val_range
-                y = ecg_y_center - (normalized - 0.5) * (ecg_height - 20)
-                
-                if 0 <= x < self.width:
-                    points.append((x, y))
+        if self._ecg_minmax_dirty:
+            self._ecg_min = float(ecg_samples.min())
+            self._ecg_max = float(ecg_samples.max())
+            self._ecg_minmax_dirty = False
+        min_val = self._ecg_min
+        max_val = self._ecg_max
+        
+        # Take recent samples to fit screen width
+        samples_to_show = min(ecg_samples.size, self.width * 2)
+        recent_samples = ecg_samples[-samples_to_show:]
+        
+        # X position (right to left scrolling)
+        xs = self.width - np.arange(recent_samples.size, 0, -1) // 2
+        
+        # Y position (normalized and inverted for display), mapped straight into
+        # the ECG strip's local coordinates: min_val -> bottom, max_val -> top
+        local_center = ecg_y_center - ecg_y_start
+        y_bottom = local_center + (ecg_height - 20) / 2
+        y_top = local_center - (ecg_height - 20) / 2
+        if max_val != min_val:
+            ys = np.interp(recent_samples, (min_val, max_val), (y_bottom, y_top))
+        else:
+            ys = np.full(recent_samples.size, y_bottom)
+        
+        on_screen = (xs >= 0) & (xs < self.width)
+        local_points = list(zip(xs[on_screen].tolist(), ys[on_screen].astype(np.int32).tolist()))
         
         # Draw ECG line with glow effect
-        if len(points) > 1:
+        if len(local_points) > 1:
             # Multiple passes for glow effect
             for thickness in range(3, 0, -1):
                 alpha = int(150 / thickness)
                 color = (0, 255, 100) if thickness == 1 else (0, 150, 50)  # Bright green ECG
                 
-                line_surf = pygame.Surface((self.width, ecg_height))
+                line_surf = self._ecg_line_surf
                 line_surf.set_alpha(alpha)
                 line_surf.fill((0, 0, 0))
-                line_surf.set_colorkey((0, 0, 0))
-                
-                # Adjust points for local surface
-                local_points = [(x, y - ecg_y_start) for x, y in points]
-                
-                if len(local_points) > 1:
-                    pygame.draw.lines(line_surf, color, False, local_points, thickness)
+                pygame.draw.lines(line_surf, color, False, local_points, thickness)
                 
                 self.screen.blit(line_surf, (0, ecg_y_start))
         
         # ECG label
-        ecg_label = self.font_small.render("ECG", True, (0, 200, 100))
-        self.screen.blit(ecg_label, (10, ecg_y_start + 5))
+        self.screen.blit(self._ecg_label, (10, ecg_y_start + 5))
     
     def draw_hud(self):
         """Draw HUD with current HR"""
@@ -353,17 +577,27 @@ class HeartbeatVisualizer:
         """Update animation and pulse effects"""
         self.pulse_phase += 0.1
         
-        # Slowly decay glow intensity if no recent updates
-        current_time = time.time()
+        # Slowly decay glow intensity if no recent updates (last frame's clock is close enough)
+        current_time = self._frame_time
         if current_time - self.last_beat_time > 2.0:
             self.glow_intensity *= 0.98
     
-    def render(self):
-        """Render the complete visualization"""
-        # Clear screen
-        self.screen.fill(self.bg_color)
+    def render(self, limit_fps: bool = True):
+        """Render the complete visualization (pass limit_fps=False when the caller paces frames)"""
+        self._frame_time = time.time()
+        
+        # Keep animating while the pulse is alive, plus one frame to settle it
+        pulse_active = self._frame_time - self.last_beat_time < 0.3
+        if pulse_active or self._pulse_was_active:
+            self._dirty = True
+        self._pulse_was_active = pulse_active
+        
+        if not self._dirty:
+            if limit_fps:
+                self.clock.tick(60)
+            return
         
-        # Draw components
+        # Draw components (the cached grid also clears the background)
         self.draw_grid()
         self.draw_heartbeat_line()
         self.draw_ecg_waveform()  # Add ECG display
@@ -371,7 +605,9 @@ class HeartbeatVisualizer:
         
         # Update display
         pygame.display.flip()
-        self.clock.tick(60)  # 60 FPS
+        self._dirty = False
+        if limit_fps:
+            self.clock.tick(60)  # 60 FPS
     
     def handle_events(self):
         """Handle pygame events"""
@@ -381,24 +617,24 @@ class HeartbeatVisualizer:
             elif event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_ESCAPE:
                     return False
+            elif event.type == pygame.VIDEOEXPOSE:
+                self._dirty = True
             elif event.type == pygame.VIDEORESIZE:
                 # Handle window resize
+                self._dirty = True
                 self.width = event.w
                 self.height = event.h
                 self.screen = pygame.display.set_mode((self.width, self.height), pygame.RESIZABLE)
+                self._create_surfaces()
+                self._rebuild_y_lut()
                 
                 # Update data storage for new width
-                new_hr_maxlen = self.width // 2
+                new_hr_maxlen = max(1, self.width // 2)  # Ring indexing needs at least one slot
                 new_ecg_maxlen = self.width * 4
                 
                 # Preserve existing data while updating maxlen
-                old_hr_data = list(self.hr_history)
-                old_time_data = list(self.time_history)
-                old_ecg_data = list(self.ecg_history)
-                
-                self.hr_history = deque(old_hr_data, maxlen=new_hr_maxlen)
-                self.time_history = deque(old_time_data, maxlen=new_hr_maxlen)
-                self.ecg_history = deque(old_ecg_data, maxlen=new_ecg_maxlen)
+                self._resize_hr_buffer(new_hr_maxlen)
+                self._resize_ecg_buffer(new_ecg_maxlen)
                 
         return True
     
@@ -416,7 +652,7 @@ class HeartbeatVisualizer:
             simulated_hr = max(self.hr_min, min(self.hr_max, simulated_hr))
             
             # Simulate RR intervals for pulse effect
-            rr_intervals = [800] if int(demo_time * 10) % 8 == 0 else []
+            rr_intervals = (800,) if int(demo_time * 10) % 8 == 0 else ()
             
             self.update_heart_rate(simulated_hr, rr_intervals)
             self.update()
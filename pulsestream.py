@@ -2,10 +2,22 @@
 import asyncio
 import threading
 import queue
+import logging
+import logging.handlers
 import time
 import os
+import atexit
+import struct
+import collections
+import functools
 from datetime import datetime
+import numpy as np
 from bleak import BleakScanner, BleakClient
+
+try:
+    from numba import njit
+except ImportError:  # Numba is optional; fall back to NumPy
+    njit = None
 from heartbeat_visualizer import HeartbeatVisualizer
 
 # Standard BLE UUIDs
@@ -17,41 +29,94 @@ PMD_SERVICE = "FB005C80-02E7-F387-1CAD-8ACD2D8DF0C8"    # PMD Service
 PMD_CONTROL = "FB005C81-02E7-F387-1CAD-8ACD2D8DF0C8"    # PMD Control Point
 PMD_DATA = "FB005C82-02E7-F387-1CAD-8ACD2D8DF0C8"       # PMD Data
 
-def parse_hrm(data: bytes):
+# Lowercase forms for service membership checks (Bleak reports lowercase UUIDs)
+_HRS_UUID = HRS_UUID.lower()
+_PMD_SERVICE = PMD_SERVICE.lower()
+
+# PMD control point commands
+# Command format: [CMD, TYPE, SAMPLE_RATE, RESOLUTION, RANGE]
+_PMD_START_ECG = bytes((
+    0x02,  # Start measurement command
+    0x00,  # ECG type
+    0x82, 0x00,  # 130 Hz sample rate (little endian)
+    0x01, 0x01, 0x0E, 0x00  # Settings
+))
+_PMD_STOP_ECG = bytes((0x03, 0x00))  # Stop command for ECG
+
+# Per-packet console output goes through a queue so the BLE callback never blocks on stdout
+log = logging.getLogger("pulsestream")
+
+# Per-packet HR lines are printed unless PULSESTREAM_VERBOSE=0
+_VERBOSE = os.environ.get("PULSESTREAM_VERBOSE", "1") != "0"
+
+def setup_console_logging():
+    """Route pulsestream log records to stderr via a background QueueListener"""
+    log_queue = queue.SimpleQueue()
+    log.addHandler(logging.handlers.QueueHandler(log_queue))
+    log.setLevel(logging.INFO if _VERBOSE else logging.WARNING)
+    log.propagate = False
+    
+    listener = logging.handlers.QueueListener(log_queue, logging.StreamHandler())
+    listener.start()
+    atexit.register(listener.stop)
+
+# Precompiled decoders for HRM packet fields
+_H8 = struct.Struct("<BB")      # Flags byte + 8-bit HR
+_H16 = struct.Struct("<BH")     # Flags byte + little-endian 16-bit HR
+_RR_SCALE = 1000.0 / 1024.0     # RR is in units of 1/1024 s; convert to ms
+
+@functools.lru_cache(maxsize=None)
+def _rr_struct(n: int) -> struct.Struct:
+    """Struct for n packed uint16 RR intervals (only a handful of counts ever occur)"""
+    return struct.Struct(f"<{n}H")
+
+# Flag bits decoded from an HRM packet
+HRFlags = collections.namedtuple("HRFlags", "sensor_contact_supported sensor_contact_detected hr_16bit")
+
+# Every possible flags byte decoded up front:
+# (hr_16bit, sensor_contact_supported, sensor_contact_detected, energy_expended_present, rr_present)
+_FLAG_TABLE = tuple(
+    ((b & 0x01) != 0, (b & 0x04) != 0, (b & 0x02) != 0, (b & 0x08) != 0, (b & 0x10) != 0)
+    for b in range(256)
+)
+_HRFLAGS_TABLE = tuple(HRFlags(supp, det, hr16) for hr16, supp, det, _, _ in _FLAG_TABLE)
+
+def parse_hrm_fast(data: bytes):
     """
     Parse BLE Heart Rate Measurement packet (Bluetooth SIG spec).
-    Returns (hr_bpm, rr_intervals_ms_list, flags_dict).
+    Returns (hr_bpm, rr_intervals_ms_tuple, flags_byte) without decoding the flag bits.
     """
-    i = 0
-    flags = data[i]; i += 1
+    flags = data[0]
+    hr_16bit, _, _, energy_expended_present, rr_present = _FLAG_TABLE[flags]
 
-    hr_16bit = bool(flags & 0x01)
-    sensor_contact_supported = bool(flags & 0x04)
-    sensor_contact_detected  = bool(flags & 0x02)
-    energy_expended_present  = bool(flags & 0x08)
-    rr_present               = bool(flags & 0x10)
+    if hr_16bit and len(data) < _H16.size:
+        # Truncated 16-bit HR: decode whatever bytes are present, as the slicing parser did
+        return int.from_bytes(data[1:3], "little"), (), flags
 
-    if hr_16bit:
-        hr = int.from_bytes(data[i:i+2], "little"); i += 2
-    else:
-        hr = data[i]; i += 1
+    # Flags and HR come out of one header unpack; bit 0 picks the HR width
+    hdr = _H16 if hr_16bit else _H8
+    _, hr = hdr.unpack_from(data, 0)
+    i = hdr.size
 
     if energy_expended_present:
         i += 2  # skip energy expended
 
-    rr_list = []
-    if rr_present:
-        while i + 1 < len(data):
-            rr = int.from_bytes(data[i:i+2], "little"); i += 2
-            # RR is in units of 1/1024 s; convert to ms
-            rr_ms = rr * 1000 / 1024
-            rr_list.append(rr_ms)
+    rr_intervals = ()
+    if rr_present and i < len(data):
+        # Remaining bytes are packed uint16 RR intervals; decode them in one call
+        n = (len(data) - i) // 2
+        raw = _rr_struct(n).unpack_from(data, i)
+        rr_intervals = tuple(v * _RR_SCALE for v in raw)
 
-    return hr, rr_list, {
-        "sensor_contact_supported": sensor_contact_supported,
-        "sensor_contact_detected": sensor_contact_detected,
-        "hr_16bit": hr_16bit
-    }
+    return hr, rr_intervals, flags
+
+def parse_hrm(data: bytes):
+    """
+    Parse BLE Heart Rate Measurement packet (Bluetooth SIG spec).
+    Returns (hr_bpm, rr_intervals_ms_tuple, HRFlags).
+    """
+    hr, rr_intervals, flags = parse_hrm_fast(data)
+    return hr, rr_intervals, _HRFLAGS_TABLE[flags]
 
 async def find_device():
     print("Scanning for Polar H10…")
@@ -63,15 +128,37 @@ async def find_device():
             return d
     raise RuntimeError("Polar H10 not found. Make sure it's on your chest and not fully connected elsewhere.")
 
-# Global data queues for passing data from BLE thread to main thread
-hr_data_queue = queue.Queue()
-ecg_data_queue = queue.Queue()
+# Global data buffers for passing data from BLE callbacks to the pygame loop.
+# Both sides run on the same event loop, so plain bounded deques are enough;
+# on overflow the oldest packets are dropped so the display stays current.
+hr_data_queue = collections.deque(maxlen=64)
+ecg_data_queue = collections.deque(maxlen=16)
+# Set by the BLE callbacks whenever a queue gains data so the pygame loop wakes
+# immediately instead of polling. Created in run() so it binds to the running loop.
+data_event = None
 
 # CSV logging setup
 csv_filename = None
+_csv_fh = None          # Session CSV file, kept open for the whole run
+CSV_FLUSH_INTERVAL = 1.0  # Seconds between flushes of buffered rows
+
+# Rows are handed to a dedicated writer thread so disk I/O never blocks BLE callbacks
+_log_q = collections.deque()
+_log_ev = threading.Event()
+_log_thread = None
+_log_stopping = False
+
+# Wall-clock timestamp string, re-formatted only when the second changes
+_last_sec = 0
+_last_ts = ""
+
+# Bound formatters for CSV list fields
+_fmt_rr = "{:.1f}".format
+_fmt_ecg = "{:.0f}".format
+
 def setup_csv_logging():
     """Create a new CSV file with timestamp for this session"""
-    global csv_filename
+    global csv_filename, _csv_fh, _log_thread
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     # Replace colons with dashes for filename compatibility
     safe_timestamp = timestamp.replace(":", "-")
@@ -81,79 +168,132 @@ def setup_csv_logging():
     os.makedirs("data", exist_ok=True)
     filepath = os.path.join("data", csv_filename)
     
-    # Write CSV header
-    with open(filepath, "w") as f:
-        f.write("timestamp,unix_time,hr_bpm,rr_intervals_ms,ecg_samples\n")
+    # Write CSV header and keep the file open (buffered) for subsequent rows
+    _csv_fh = open(filepath, "w", buffering=1 << 16)
+    _csv_fh.write("timestamp,unix_time,hr_bpm,rr_intervals_ms,ecg_samples\n")
+    
+    # Start the writer thread; it drains and closes the file at exit
+    _log_thread = threading.Thread(target=_csv_logger, name="csv-logger", daemon=True)
+    _log_thread.start()
+    atexit.register(_close_csv_logging)
     
     print(f"📊 Logging heart rate data to: data/{csv_filename}")
     return filepath
 
+def _csv_logger():
+    """Write queued CSV rows to disk, flushing at most once per interval"""
+    last_flush = time.time()
+    while True:
+        _log_ev.wait(CSV_FLUSH_INTERVAL)
+        _log_ev.clear()
+        
+        while _log_q:
+            _csv_fh.write(_log_q.popleft())
+        
+        now = time.time()
+        if _log_stopping:
+            break
+        if now - last_flush >= CSV_FLUSH_INTERVAL:
+            _csv_fh.flush()
+            last_flush = now
+
+def _close_csv_logging():
+    """Stop the writer thread after it drains pending rows, then close the file"""
+    global _log_stopping
+    _log_stopping = True
+    _log_ev.set()
+    _log_thread.join(timeout=2.0)
+    _csv_fh.close()
+
 def log_hr_data(hr, rr_list, ecg_samples=None):
-    """Log heart rate and ECG data to CSV"""
-    if csv_filename:
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    """Queue heart rate and ECG data for the CSV writer thread"""
+    global _last_sec, _last_ts
+    if _csv_fh is not None:
         unix_time = time.time()
-        rr_str = ";".join(f"{r:.1f}" for r in rr_list) if rr_list else ""
-        ecg_str = ";".join(f"{s:.0f}" for s in ecg_samples) if ecg_samples else ""
+        sec = int(unix_time)
+        if sec != _last_sec:
+            _last_ts = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(unix_time))
+            _last_sec = sec
+        
+        rr_str = ";".join(map(_fmt_rr, rr_list)) if rr_list else ""
+        ecg_str = ";".join(map(_fmt_ecg, ecg_samples)) if ecg_samples is not None and len(ecg_samples) else ""
         
-        filepath = os.path.join("data", csv_filename)
-        with open(filepath, "a") as f:
-            f.write(f"{timestamp},{unix_time:.3f},{hr},{rr_str},{ecg_str}\n")
+        _log_q.append(f"{_last_ts},{unix_time:.3f},{hr},{rr_str},{ecg_str}\n")
+        _log_ev.set()
 
-def parse_ecg_data(data: bytes):
-    """Parse Polar ECG data from PMD service"""
+if njit is not None:
+    @njit(cache=True)
+    def _decode_ecg(buf):
+        """Decode packed little-endian signed 24-bit samples from a uint8 buffer"""
+        n = buf.size // 3
+        out = np.empty(n, dtype=np.int32)
+        for k in range(n):
+            j = 3 * k
+            v = np.int32(buf[j]) | (np.int32(buf[j + 1]) << 8) | (np.int32(buf[j + 2]) << 16)
+            if v & 0x800000:
+                v -= 0x1000000
+            out[k] = v
+        return out
+
+    # Compile (or load from cache) at import so the first ECG packet isn't delayed
+    _decode_ecg(np.zeros(3, dtype=np.uint8))
+else:
+    def _decode_ecg(buf):
+        """Decode packed little-endian signed 24-bit samples from a uint8 buffer"""
+        # Only whole 3-byte samples are decoded
+        n = buf.size // 3
+        raw = buf[:n * 3].reshape(n, 3)
+        
+        # Widen each sample to 4 bytes in the one output buffer and view it as int32
+        padded = np.zeros((n, 4), dtype=np.uint8)
+        padded[:, :3] = raw
+        samples = padded.view("<i4").reshape(n)
+        
+        # Sign-extend from bit 23 in place: shift the sign bit to the top and back
+        samples <<= 8
+        samples >>= 8
+        return samples
+
+def parse_ecg_data(data: bytes) -> np.ndarray:
+    """Parse Polar ECG data from PMD service into an int32 array of samples"""
     if len(data) < 10:
-        return []
+        return np.empty(0, dtype=np.int32)
     
     # Polar ECG format: first byte is frame type, skip some header bytes
     # ECG samples are typically 3 bytes each, signed 24-bit values
-    samples = []
-    
     # Skip header (varies, but typically ~10 bytes)
-    start_idx = 10
-    
-    # Parse 3-byte signed ECG samples
-    for i in range(start_idx, len(data) - 2, 3):
-        if i + 2 < len(data):
-            # Convert 3-byte signed value to int (little endian)
-            sample = int.from_bytes(data[i:i+3], 'little', signed=True)
-            samples.append(sample)
-    
-    return samples
+    return _decode_ecg(np.frombuffer(data, dtype=np.uint8, offset=10))
 
 def ecg_notification_handler(_, data: bytearray):
     """Handle ECG data notifications"""
     try:
         samples = parse_ecg_data(data)
-        if samples:
-            # Put ECG data in queue for main thread
-            try:
-                ecg_data_queue.put_nowait(samples)
-            except queue.Full:
-                pass  # Skip if queue is full
+        if samples.size:
+            # Put ECG data in queue for the pygame loop
+            ecg_data_queue.append(samples)
+            data_event.set()
     except Exception as e:
         print(f"ECG parsing error: {e}")
 
 def notification_handler(_, data: bytearray):
-    hr, rr_list, flags = parse_hrm(data)
-    rr_str = ", ".join(f"{x:.1f} ms" for x in rr_list) if rr_list else "—"
-    contact = "yes" if flags["sensor_contact_detected"] else "no/unknown"
-    print(f"HR: {hr:3d} bpm | contact: {contact} | RR: {rr_str}")
+    hr, rr_list, flags = parse_hrm_fast(data)
+    if _VERBOSE:
+        rr_str = ", ".join(f"{x:.1f} ms" for x in rr_list) if rr_list else "—"
+        contact = "yes" if _FLAG_TABLE[flags][2] else "no/unknown"
+        log.info("HR: %3d bpm | contact: %s | RR: %s", hr, contact, rr_str)
     
     # Log to CSV
     log_hr_data(hr, rr_list)
     
-    # Put HR data in queue for main thread to consume
-    try:
-        hr_data_queue.put_nowait((hr, rr_list, flags))
-    except queue.Full:
-        pass  # Skip if queue is full
+    # Put HR data in queue for the pygame loop to consume
+    hr_data_queue.append((hr, rr_list, flags))
+    data_event.set()
 
-async def start_ecg_stream(client):
+async def start_ecg_stream(client, svc_uuids: frozenset):
     """Start ECG data streaming via PMD service"""
     try:
         # Check if PMD service is available
-        if PMD_SERVICE not in [s.uuid for s in client.services]:
+        if _PMD_SERVICE not in svc_uuids:
             print("⚠️  PMD service not found - ECG not available")
             return False
         
@@ -163,15 +303,7 @@ async def start_ecg_stream(client):
         await client.start_notify(PMD_DATA, ecg_notification_handler)
         
         # Send command to start ECG streaming (130 Hz)
-        # Command format: [CMD, TYPE, SAMPLE_RATE, RESOLUTION, RANGE]
-        start_cmd = bytearray([
-            0x02,  # Start measurement command
-            0x00,  # ECG type
-            0x82, 0x00,  # 130 Hz sample rate (little endian)
-            0x01, 0x01, 0x0E, 0x00  # Settings
-        ])
-        
-        await client.write_gatt_char(PMD_CONTROL, start_cmd)
+        await client.write_gatt_char(PMD_CONTROL, _PMD_START_ECG)
         print("✅ ECG streaming started (130 Hz)")
         return True
         
@@ -180,23 +312,25 @@ async def start_ecg_stream(client):
         return False
 
 async def run_bluetooth():
-    """Run the Bluetooth connection in background"""
+    """Run the Bluetooth connection alongside the pygame loop"""
     try:
         dev = await find_device()
         async with BleakClient(dev) as client:
+            # Enumerate services once (normalized to lowercase); both checks below reuse the set
+            svc_uuids = frozenset(s.uuid.lower() for s in client.services)
+            
             # Verify heart rate service exists
-            svcs = client.services
-            assert HRS_UUID in [s.uuid for s in svcs], "Heart Rate Service not found."
+            assert _HRS_UUID in svc_uuids, "Heart Rate Service not found."
 
             print("Subscribing to Heart Rate notifications…")
             await client.start_notify(HRM_CHAR, notification_handler)
 
             # Try to start ECG streaming
-            ecg_started = await start_ecg_stream(client)
+            ecg_started = await start_ecg_stream(client, svc_uuids)
             
             print("Bluetooth connected. Streaming heart rate data" + (" + ECG" if ecg_started else "") + "...")
             
-            # Keep running until the main thread stops
+            # Keep running until the pygame loop exits and cancels us
             try:
                 while True:
                     await asyncio.sleep(1)
@@ -205,8 +339,7 @@ async def run_bluetooth():
                 if ecg_started:
                     try:
                         # Stop ECG streaming
-                        stop_cmd = bytearray([0x03, 0x00])  # Stop command for ECG
-                        await client.write_gatt_char(PMD_CONTROL, stop_cmd)
+                        await client.write_gatt_char(PMD_CONTROL, _PMD_STOP_ECG)
                         await client.stop_notify(PMD_DATA)
                         print("🛑 ECG streaming stopped")
                     except:
@@ -215,53 +348,70 @@ async def run_bluetooth():
     except Exception as e:
         print(f"Bluetooth error: {e}")
         # Put error marker in queue
-        hr_data_queue.put_nowait((0, [], {"error": str(e)}))
+        hr_data_queue.append((0, (), {"error": str(e)}))
+        data_event.set()
 
-def main():
-    """Main function - runs pygame on main thread, Bluetooth in background"""
-    print("Starting heart rate monitor with visualization...")
-    
-    # Setup CSV logging for this session
-    setup_csv_logging()
-    
-    # Start Bluetooth in background thread
-    def run_async_bluetooth():
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        loop.run_until_complete(run_bluetooth())
-    
-    bt_thread = threading.Thread(target=run_async_bluetooth, daemon=True)
-    bt_thread.start()
-    
-    # Run pygame visualizer on main thread (required for macOS)
-    visualizer = HeartbeatVisualizer(hr_min=20, hr_max=180)
-    print("Pygame visualizer started on main thread")
-    print("Press ESC or close window to exit")
+async def pygame_loop(visualizer: HeartbeatVisualizer, fps: int = 60):
+    """Drive the visualizer from the event loop, yielding to Bluetooth I/O between frames"""
+    loop = asyncio.get_running_loop()
+    frame_time = 1 / fps
     
     running = True
     while running:
+        frame_start = loop.time()
+        
         # Handle pygame events
         running = visualizer.handle_events()
         
         # Process any heart rate data from the queue
-        try:
-            while True:
-                hr, rr_list, flags = hr_data_queue.get_nowait()
-                visualizer.update_heart_rate(hr, rr_list)
-        except queue.Empty:
-            pass  # No new data
+        while hr_data_queue:
+            hr, rr_list, flags = hr_data_queue.popleft()
+            visualizer.update_heart_rate(hr, rr_list)
         
         # Process any ECG data from the queue
-        try:
-            while True:
-                ecg_samples = ecg_data_queue.get_nowait()
-                visualizer.update_ecg_data(ecg_samples)
-        except queue.Empty:
-            pass  # No new ECG data
+        while ecg_data_queue:
+            visualizer.update_ecg_data(ecg_data_queue.popleft())
         
-        # Update and render
+        # Update and render (frame pacing happens here, not in pygame's clock)
         visualizer.update()
-        visualizer.render()
+        visualizer.render(limit_fps=False)
+        
+        # Sleep until new data arrives, waking at least once per frame for window events
+        try:
+            await asyncio.wait_for(data_event.wait(), max(0, frame_time - (loop.time() - frame_start)))
+        except asyncio.TimeoutError:
+            pass
+        data_event.clear()
+
+async def run(visualizer: HeartbeatVisualizer):
+    """Run Bluetooth and the visualizer on one event loop until the window closes"""
+    global data_event
+    data_event = asyncio.Event()
+    bt_task = asyncio.create_task(run_bluetooth())
+    try:
+        await pygame_loop(visualizer)
+    finally:
+        # Let run_bluetooth stop notifications and disconnect cleanly
+        bt_task.cancel()
+        try:
+            await bt_task
+        except asyncio.CancelledError:
+            pass
+
+def main():
+    """Main function - runs pygame and Bluetooth on a single asyncio loop on the main thread"""
+    print("Starting heart rate monitor with visualization...")
+    setup_console_logging()
+    
+    # Setup CSV logging for this session
+    setup_csv_logging()
+    
+    # Run pygame visualizer on main thread (required for macOS)
+    visualizer = HeartbeatVisualizer(hr_min=20, hr_max=180)
+    print("Pygame visualizer started on main thread")
+    print("Press ESC or close window to exit")
+    
+    asyncio.run(run(visualizer))
     
     print("Visualizer closed")
 